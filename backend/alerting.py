@@ -63,6 +63,50 @@ Status: FAILED
     else:
         logger.warning(f"No alert methods configured for {pipeline} failure")
 
+def alert_health(event: dict):
+    """
+    Send a pipeline health alert (duration regression or flakiness) raised by the streaming detector.
+    
+    Args:
+        event: Detector event, ``{"event": "pipeline_regression" | "pipeline_flaky", "data": {...}}``
+    """
+    data = event["data"]
+    pipeline, repo = data["pipeline"], data["repo"]
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+    
+    if event["event"] == "pipeline_regression":
+        title = "🐢 CI/CD Pipeline Slowdown Alert"
+        detail = (f"Build time up {data['increase_pct']}%: "
+                  f"{data['baseline_seconds']:.0f}s → {data['current_seconds']:.0f}s")
+        email_subject = f"⚠️ CI/CD Slowdown: {pipeline} in {repo}"
+    else:
+        title = "🎲 CI/CD Flaky Pipeline Alert"
+        detail = f"Results flip between success and failure ({data['flip_rate']:.0%} of recent builds)"
+        email_subject = f"⚠️ CI/CD Flaky Pipeline: {pipeline} in {repo}"
+    
+    slack_message = f"""*{title}*
+📋 *Pipeline:* {pipeline}
+📁 *Repository:* {repo}
+🕒 *Time:* {timestamp}
+📝 *Details:* {detail}"""
+    
+    email_body = f"""{title[2:]}
+
+Pipeline: {pipeline}
+Repository: {repo}
+Time: {timestamp}
+Details: {detail}
+
+This is an automated alert from the CI/CD Pipeline Health Dashboard."""
+    
+    slack_sent = _send_slack_alert(slack_message)
+    email_sent = _send_email_alert(email_subject, email_body)
+    
+    if slack_sent or email_sent:
+        logger.info(f"Health alert sent for {pipeline} ({event['event']}) - Slack: {slack_sent}, Email: {email_sent}")
+    else:
+        logger.warning(f"No alert methods configured for {pipeline} {event['event']}")
+
 def _send_slack_alert(message: str) -> bool:
     """Send alert to Slack via webhook. Returns True if successful."""
     if not SLACK_WEBHOOK:
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Historical backfill importer for GitHub Actions and Jenkins builds.
+
+Reads exported run archives (GitHub Actions ``actions/runs`` JSON pages, Jenkins
+``api/json`` dumps) or pages through the provider APIs, parses them in a process
+pool with the same mapping logic the webhook handlers use, and bulk-inserts the
+builds in large transactions. Every archive file is checkpointed in the same
+transaction as its rows, so an interrupted import resumes where it stopped. API
+imports record a high-water mark instead (the APIs list newest first, so page
+contents shift as new runs arrive) and later imports stop paging once they reach it.
+
+Usage:
+    python backfill.py github --repo owner/name exports/github/
+    python backfill.py github --repo owner/name --api
+    python backfill.py jenkins --job deploy-staging exports/jenkins/*.json
+    python backfill.py jenkins --job deploy-staging --api --jenkins-url http://jenkins:8080
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+import requests
+from requests.auth import HTTPBasicAuth
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.engine import Engine
+from database import Base, SQLALCHEMY_DATABASE_URL, upgrade_schema
+from models import Build, BackfillCheckpoint
+from mappers import build_values, github_run_to_ingest, jenkins_build_to_ingest
+from search import bulk_indexing, init_search_index
+
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+JENKINS_USER = os.getenv("JENKINS_USER", "")
+JENKINS_TOKEN = os.getenv("JENKINS_TOKEN", "")
+API_PAGE_SIZE = 100
+JENKINS_TREE = "allBuilds[number,result,timestamp,duration,url,actions[queuingDurationMillis]]"
+
+# A source is (key, provider, options); key is a file path or API page URL.
+Source = Tuple[str, str, dict]
+# (run id or build number, finished) for every run in a source
+RunIds = List[Tuple[int, bool]]
+
+def github_rows(document, repo: Optional[str]) -> Tuple[int, List[dict]]:
+    """Normalize a GitHub Actions runs page (or list of runs) into (runs seen, Build rows)."""
+    if isinstance(document, dict):
+        runs = document.get("workflow_runs", [document] if "run_number" in document else [])
+    else:
+        runs = document
+    rows = []
+    for run in runs:
+        # Same rule as the webhook handler: only completed runs are recorded
+        if run.get("status") != "completed":
+            continue
+        run_repo = (run.get("repository") or {}).get("full_name") or repo or "unknown"
+        rows.append(build_values("github", github_run_to_ingest(run, run_repo)))
+    return len(runs), rows
+
+def jenkins_rows(document, job: Optional[str]) -> Tuple[int, List[dict]]:
+    """Normalize a Jenkins job or build ``api/json`` dump into (builds seen, Build rows)."""
+    if isinstance(document, dict):
+        builds = document.get("allBuilds") or document.get("builds")
+        if builds is None:
+            builds = [document] if "number" in document else []
+        job = job or document.get("fullName") or document.get("name")
+    else:
+        builds = document
+    rows = []
+    for build in builds:
+        # Like GitHub runs, builds still running are left for a later import once finished:
+        # the URL de-duplication would otherwise keep the in-progress row forever
+        if build.get("result") is None:
+            continue
+        name = job or (build.get("fullDisplayName") or "").split(" #")[0]
+        rows.append(build_values("jenkins", jenkins_build_to_ingest(build, name)))
+    return len(builds), rows
+
+def run_ids(provider: str, document) -> RunIds:
+    """Run ids (GitHub) / build numbers (Jenkins) in a document, flagging finished runs."""
+    if provider == "github":
+        runs = document.get("workflow_runs", []) if isinstance(document, dict) else document
+        return [(r["id"], r.get("status") == "completed") for r in runs if r.get("id") is not None]
+    builds = (document.get("allBuilds") or document.get("builds") or []) if isinstance(document, dict) else document
+    return [(b["number"], b.get("result") is not None) for b in builds if b.get("number") is not None]
+
+def _load_source(source: Source) -> Tuple[str, int, List[dict], RunIds]:
+    """Process-pool worker: read one archive file or API page and normalize it."""
+    key, provider, opts = source
+    if opts.get("api"):
+        if provider == "github":
+            headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+            resp = requests.get(key, headers=headers, timeout=30)
+        else:
+            resp = requests.get(key, auth=HTTPBasicAuth(JENKINS_USER, JENKINS_TOKEN), timeout=30)
+        resp.raise_for_status()
+        document = resp.json()
+    else:
+        with open(key) as f:
+            document = json.load(f)
+    if provider == "github":
+        seen, rows = github_rows(document, opts.get("repo"))
+    else:
+        seen, rows = jenkins_rows(document, opts.get("job"))
+    return key, seen, rows, run_ids(provider, document) if opts.get("api") else []
+
+def _file_sources(paths: Iterable[str], provider: str, opts: dict) -> List[Source]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.json"), recursive=True)))
+        else:
+            files.append(path)
+    return [(os.path.abspath(p), provider, opts) for p in files]
+
+def _file_checkpoint(provider: str, path: str) -> str:
+    """Checkpoint key of an archive file; per provider, so a file is never marked done for the wrong parser."""
+    return f"{provider}:{path}"
+
+def _api_page(provider: str, opts: dict, page: int) -> str:
+    if provider == "github":
+        return f"https://api.github.com/repos/{opts['repo']}/actions/runs?per_page={API_PAGE_SIZE}&page={page + 1}"
+    start = page * API_PAGE_SIZE
+    return f"{opts['jenkins_url']}/job/{opts['job']}/api/json?tree={JENKINS_TREE}{{{start},{start + API_PAGE_SIZE}}}"
+
+def _api_stream(provider: str, opts: dict) -> str:
+    """Checkpoint key of an API import (one per repository / job)."""
+    if provider == "github":
+        return f"api:github:{opts['repo']}"
+    return f"api:jenkins:{opts['jenkins_url']}/job/{opts['job']}"
+
+def next_high_water(ids: RunIds, previous: Optional[int]) -> Optional[int]:
+    """
+    New high-water mark after a complete API import: the newest finished run, but below
+    any run still in progress so it is fetched again (and recorded) once it finishes.
+    """
+    finished = [i for i, done in ids if done]
+    pending = [i for i, done in ids if not done]
+    mark = max(finished, default=previous)
+    if mark is not None and pending:
+        mark = min(mark, min(pending) - 1)
+    return mark
+
+class Importer:
+    """Batches normalized rows into large transactions and records checkpoints."""
+
+    def __init__(self, engine: Engine, batch_size: int = 5000, stream: Optional[str] = None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.stream = stream  # API imports: one checkpoint row for the whole stream
+        self.pending_rows: List[dict] = []
+        self.pending_sources: List[Tuple[str, int]] = []
+        self.imported = 0
+        self.skipped = 0
+        self.sources_done = 0
+        self.started = time.monotonic()
+
+    def completed_sources(self) -> set:
+        with self.engine.connect() as conn:
+            return set(conn.execute(select(BackfillCheckpoint.source)).scalars())
+
+    def high_water(self) -> Optional[int]:
+        """The stream's high-water mark, creating its checkpoint row on first use."""
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(BackfillCheckpoint.id, BackfillCheckpoint.high_water).where(BackfillCheckpoint.source == self.stream)
+            ).first()
+            if row is None:
+                conn.execute(insert(BackfillCheckpoint).values(source=self.stream, runs=0))
+                return None
+            return row.high_water
+
+    def set_high_water(self, mark: Optional[int]):
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(BackfillCheckpoint).where(BackfillCheckpoint.source == self.stream).values(high_water=mark)
+            )
+
+    def add(self, key: str, rows: List[dict]):
+        self.pending_rows.extend(rows)
+        self.pending_sources.append((key, len(rows)))
+        if len(self.pending_rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_sources:
+            return
+        rows = self._without_duplicates(self.pending_rows)
+        with self.engine.begin() as conn:
+            # Checkpoints first: this also opens the transaction bulk_indexing() relies on
+            if self.stream:
+                conn.execute(
+                    update(BackfillCheckpoint)
+                    .where(BackfillCheckpoint.source == self.stream)
+                    .values(runs=BackfillCheckpoint.runs + len(rows))
+                )
+            else:
+                conn.execute(
+                    insert(BackfillCheckpoint),
+                    [{"source": key, "runs": n} for key, n in self.pending_sources],
+                )
+            if rows:
+                with bulk_indexing(conn):
+                    conn.execute(insert(Build), rows)
+        self.imported += len(rows)
+        self.skipped += len(self.pending_rows) - len(rows)
+        self.sources_done += len(self.pending_sources)
+        self.pending_rows, self.pending_sources = [], []
+
+    def _without_duplicates(self, rows: List[dict]) -> List[dict]:
+        """Drop runs already stored (e.g. by the live collectors), keyed by build URL."""
+        urls = list({r["url"] for r in rows if r["url"]})
+        existing = set()
+        with self.engine.connect() as conn:
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                existing.update(conn.execute(select(Build.url).where(Build.url.in_(chunk))).scalars())
+        seen = set()
+        unique = []
+        for r in rows:
+            if r["url"]:
+                if r["url"] in existing or r["url"] in seen:
+                    continue
+                seen.add(r["url"])
+            unique.append(r)
+        return unique
+
+    def progress(self, total: Optional[int] = None):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        of_total = f"/{total}" if total is not None else ""
+        print(f"[backfill] {self.sources_done}{of_total} sources, {self.imported} runs imported, "
+              f"{self.skipped} duplicates skipped ({self.imported / elapsed:.0f} runs/s)")
+
+def import_api_pages(
+    importer: Importer,
+    load_wave: Callable[[int, int], Iterable[Tuple[str, int, List[dict], RunIds]]],
+    wave_size: int,
+):
+    """
+    Page through an API listing with ``load_wave(first_page, count)``, which returns the
+    ``_load_source`` results of that many consecutive pages.
+
+    Runs are listed newest first, so pages shift as new runs arrive: rather than
+    checkpointing pages, fetch in waves until a page comes back empty or reaches the
+    previous import's high-water mark. Overlap is dropped by URL de-duplication.
+    """
+    previous = importer.high_water()
+    ids: RunIds = []
+    page = 0
+    exhausted = False
+    while not exhausted:
+        for key, seen, rows, page_ids in load_wave(page, wave_size):
+            if not seen:
+                exhausted = True
+                break
+            importer.add(key, rows)
+            ids.extend(page_ids)
+            if previous is not None and any(i <= previous for i, _ in page_ids):
+                exhausted = True
+                break
+        page += wave_size
+        importer.flush()
+        importer.progress()
+    # Only after a complete pass, so an interrupted import starts over from page one
+    importer.set_high_water(next_high_water(ids, previous))
+
+def run_backfill(
+    provider: str,
+    paths: Iterable[str] = (),
+    api: bool = False,
+    repo: Optional[str] = None,
+    job: Optional[str] = None,
+    jenkins_url: str = "http://localhost:8080",
+    database_url: str = SQLALCHEMY_DATABASE_URL,
+    workers: Optional[int] = None,
+    batch_size: int = 5000,
+) -> Importer:
+    """Import historical builds; returns the Importer with final counters."""
+    engine = create_engine(database_url, connect_args={"check_same_thread": False} if database_url.startswith("sqlite") else {})
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    init_search_index(engine)
+
+    opts = {"api": api, "repo": repo, "job": job, "jenkins_url": jenkins_url.rstrip("/")}
+    importer = Importer(engine, batch_size=batch_size, stream=_api_stream(provider, opts) if api else None)
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if not api:
+            done = importer.completed_sources()
+            sources = [s for s in _file_sources(paths, provider, opts) if _file_checkpoint(provider, s[0]) not in done]
+            for key, _, rows, _ in pool.map(_load_source, sources, chunksize=max(1, len(sources) // (workers * 8))):
+                importer.add(_file_checkpoint(provider, key), rows)
+                if importer.sources_done and not importer.pending_sources:
+                    importer.progress(len(sources))
+            importer.flush()
+            importer.progress(len(sources))
+        else:
+            def load_wave(first: int, count: int):
+                sources = [(_api_page(provider, opts, p), provider, opts) for p in range(first, first + count)]
+                return pool.map(_load_source, sources)
+            import_api_pages(importer, load_wave, workers)
+    return importer
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Backfill historical CI/CD builds into the dashboard database")
+    parser.add_argument("provider", choices=["github", "jenkins"])
+    parser.add_argument("paths", nargs="*", help="Archive files or directories of *.json exports")
+    parser.add_argument("--api", action="store_true", help="Page through the provider API instead of reading files")
+    parser.add_argument("--repo", default=os.getenv("REPO"), help="GitHub repository (owner/name)")
+    parser.add_argument("--job", default=os.getenv("JOB"), help="Jenkins job name")
+    parser.add_argument("--jenkins-url", default=os.getenv("JENKINS_URL", "http://localhost:8080"))
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Runs per transaction")
+    args = parser.parse_args(argv)
+
+    if args.api and args.provider == "github" and not args.repo:
+        parser.error("--repo is required with --api for GitHub")
+    if args.api and args.provider == "jenkins" and not args.job:
+        parser.error("--job is required with --api for Jenkins")
+    if not args.api and not args.paths:
+        parser.error("give archive paths or --api")
+
+    run_backfill(
+        args.provider, args.paths, api=args.api, repo=args.repo, job=args.job,
+        jenkins_url=args.jenkins_url, database_url=args.database_url,
+        workers=args.workers, batch_size=args.batch_size,
+    )
+
+if __name__ == "__main__":
+    main()
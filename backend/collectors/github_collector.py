@@ -6,13 +6,55 @@ GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")  # personal access token or fine-graine
 REPO = os.getenv("REPO", "owner/name")
 INTERVAL = int(os.getenv("INTERVAL", "60"))
 
+# Completed runs whose jobs were already fetched. Only runs still in the latest listing are
+# kept: once a run drops out of it, it is never polled again.
+jobs_fetched = set()
+
+def queue_seconds(item):
+    """Time between the run being queued (created_at) and starting on a runner."""
+    if not (item.get("created_at") and item.get("run_started_at")):
+        return None
+    created = datetime.fromisoformat(item["created_at"].replace("Z", "+00:00"))
+    started = datetime.fromisoformat(item["run_started_at"].replace("Z", "+00:00"))
+    return max((started - created).total_seconds(), 0.0)
+
+def fetch_jobs(item, headers):
+    """Per-job timings for a workflow run, shaped like the backend's stage payload."""
+    if not item.get("jobs_url"):
+        return None
+    try:
+        resp = requests.get(item["jobs_url"], headers=headers, timeout=10)
+        resp.raise_for_status()
+    except Exception as e:
+        print("Jobs fetch error:", e)
+        return None
+    return [
+        {
+            "name": job.get("name") or "job",
+            "kind": "job",
+            "status": job.get("conclusion") or job.get("status"),
+            "started_at": job.get("started_at"),
+            "completed_at": job.get("completed_at"),
+        }
+        for job in resp.json().get("jobs", [])
+    ]
+
 def run():
     headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
     url = f"https://api.github.com/repos/{REPO}/actions/runs?per_page=10"
     resp = requests.get(url, headers=headers, timeout=10)
     resp.raise_for_status()
-    for item in resp.json().get("workflow_runs", []):
+    runs = resp.json().get("workflow_runs", [])
+    jobs_fetched.intersection_update(item.get("id") for item in runs)
+    for item in runs:
         status = item.get("conclusion") or ("in_progress" if item.get("status") != "completed" else "cancelled")
+        # One jobs request per run, once it has completed (keeps unauthenticated polling
+        # within GitHub's 60 requests/hour)
+        stages = None
+        if item.get("status") == "completed" and item.get("id") not in jobs_fetched:
+            stages = fetch_jobs(item, headers)
+            if stages is not None:
+                jobs_fetched.add(item.get("id"))
         payload = {
             "pipeline": item.get("name") or "github-workflow",
             "repo": REPO,
@@ -21,8 +63,10 @@ def run():
             "started_at": item.get("run_started_at"),
             "completed_at": item.get("updated_at"),
             "duration_seconds": None,
+            "queued_seconds": queue_seconds(item),
             "url": item.get("html_url"),
-            "logs": None
+            "logs": None,
+            "stages": stages
         }
         try:
             requests.post(f"{BACKEND}/ingest/github", json=payload, timeout=5)
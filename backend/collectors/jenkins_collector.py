@@ -1,4 +1,5 @@
 import os, requests, time
+from datetime import datetime, timezone
 from requests.auth import HTTPBasicAuth
 
 BACKEND = os.getenv("BACKEND_URL", "http://localhost:8001")
@@ -7,7 +8,41 @@ JENKINS_USER = os.getenv("JENKINS_USER", "")
 JENKINS_TOKEN = os.getenv("JENKINS_TOKEN", "")
 JOB = os.getenv("JOB", "")
 
+# Number of the last build whose stages were posted: stages are sent once, when it has finished
+stages_posted_for = None
+
+def fetch_stages(number):
+    """Per-stage timings from the Pipeline REST API, shaped like the backend's stage payload."""
+    url = f"{JENKINS_URL}/job/{JOB}/{number}/wfapi/describe"
+    try:
+        resp = requests.get(url, auth=HTTPBasicAuth(JENKINS_USER, JENKINS_TOKEN), timeout=10)
+        if resp.status_code != 200:
+            return None  # not a Pipeline job, or the Pipeline Stage View plugin is missing
+        describe = resp.json()
+    except Exception as e:
+        print("Stages fetch error:", e)
+        return None
+    stages = []
+    for stage in describe.get("stages", []):
+        start_ms = stage.get("startTimeMillis")
+        stages.append({
+            "name": stage.get("name") or "stage",
+            "kind": "stage",
+            "status": (stage.get("status") or "").lower() or None,
+            "started_at": datetime.fromtimestamp(start_ms / 1000.0, tz=timezone.utc).isoformat() if start_ms else None,
+            "duration_seconds": (stage.get("durationMillis") or 0) / 1000.0,
+        })
+    return stages
+
+def queue_seconds(data):
+    """Time in queue, reported by the Jenkins Metrics plugin's TimeInQueueAction."""
+    for action in data.get("actions") or []:
+        if action and "queuingDurationMillis" in action:
+            return action["queuingDurationMillis"] / 1000.0
+    return None
+
 def run():
+    global stages_posted_for
     url = f"{JENKINS_URL}/job/{JOB}/lastBuild/api/json"
     resp = requests.get(url, auth=HTTPBasicAuth(JENKINS_USER, JENKINS_TOKEN), timeout=10)
     if resp.status_code != 200:
@@ -18,6 +53,12 @@ def run():
     status = "success" if result == "SUCCESS" else ("failure" if result == "FAILURE" else "in_progress")
     duration = (data.get("duration") or 0) / 1000.0
     started_ts = (data.get("timestamp") or 0) / 1000.0
+    # Running builds report partial stage durations
+    stages = None
+    if result is not None and data.get("number") != stages_posted_for:
+        stages = fetch_stages(data.get("number"))
+        if stages is not None:
+            stages_posted_for = data.get("number")
 
     payload = {
         "pipeline": JOB or "jenkins-job",
@@ -27,8 +68,10 @@ def run():
         "started_at": None if not started_ts else __import__("datetime").datetime.fromtimestamp(started_ts, tz=__import__("datetime").timezone.utc).isoformat(),
         "completed_at": None,
         "duration_seconds": duration,
+        "queued_seconds": queue_seconds(data),
         "url": f"{JENKINS_URL}/job/{JOB}/{data.get('number')}",
-        "logs": None
+        "logs": None,
+        "stages": stages
     }
     try:
         requests.post(f"{BACKEND}/ingest/jenkins", json=payload, timeout=5)
@@ -0,0 +1,249 @@
+import heapq, os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+from models import Build
+
+# Builds started this long before the window are still considered, so runs already in
+# progress when the window opens are counted (without an unindexable overlap predicate).
+LOOKBACK_HOURS = float(os.getenv("CONCURRENCY_LOOKBACK_HOURS", "24"))
+MAX_BUCKETS = 10000
+STREAM_BATCH = 5000
+
+def parse_duration(value: str) -> timedelta:
+    """Parse a bucket size such as ``15m``, ``1h`` or ``1d``."""
+    units = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+    try:
+        return timedelta(**{units[value[-1]]: int(value[:-1])})
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f"Invalid duration '{value}', expected e.g. 15m, 1h or 1d")
+
+def _epoch(dt: datetime) -> float:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _sql_epoch(db: Session, col):
+    """Seconds since the Unix epoch, computed in the database to skip per-row datetime parsing."""
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(col) - 2440587.5) * 86400.0
+    return func.extract("epoch", col)
+
+# Separates provider and pipeline in the combined group key selected by the query
+KEY_SEP = "\x1f"
+
+def _group_out(key: str, builds: int, peak: int, busy: float, queued: list,
+               span: float, capacity: Optional[int]) -> dict:
+    """Output row for one group; ``queued`` is [total, count, max]."""
+    avg = busy / span if span > 0 else 0.0
+    denominator = capacity or peak
+    return {
+        "key": key,
+        "builds": builds,
+        "peak_concurrency": peak,
+        "avg_concurrency": avg,
+        "utilization": avg / denominator if denominator else None,
+        "avg_queue_seconds": queued[0] / queued[1] if queued[1] else None,
+        "max_queue_seconds": queued[2],
+    }
+
+def _merge_queued(into: list, q: list):
+    into[0] += q[0]
+    into[1] += q[1]
+    if q[2] is not None and (into[2] is None or q[2] > into[2]):
+        into[2] = q[2]
+
+def concurrency_metrics(
+    db: Session,
+    since: datetime,
+    until: datetime,
+    bucket: timedelta,
+    provider: Optional[str] = None,
+    pipeline: Optional[str] = None,
+    capacity: Optional[int] = None,
+) -> dict:
+    """
+    Running-build count over time, peak concurrency and time-weighted utilization.
+
+    Sort-and-sweep: builds are streamed in ``started_at`` order from the index, each
+    start is a +1 event and its end is pushed on a min-heap; ends are popped as -1 events
+    once the sweep passes them. O(n log n) overall, O(running builds) memory, and no
+    per-bucket overlap queries. Utilization is average concurrency divided by
+    ``capacity`` when given, otherwise by the observed peak.
+    """
+    t0, t1 = _epoch(since), _epoch(until)
+    size = bucket.total_seconds()
+    n_buckets = int(-(-(t1 - t0) // size)) if size > 0 else 0
+    if not 0 < n_buckets <= MAX_BUCKETS:
+        raise ValueError(f"Bucket too small for the window (at most {MAX_BUCKETS} buckets)")
+    now = _epoch(datetime.now(timezone.utc))
+
+    start_col = _sql_epoch(db, Build.started_at)
+    # Run time: the duration (set for nearly every build, so the start is converted only
+    # once), else completion - start, else up to "now" while still running
+    duration_col = func.coalesce(
+        Build.duration_seconds,
+        _sql_epoch(db, Build.completed_at) - start_col,
+        case((Build.status == "in_progress", now - start_col)),
+    )
+    query = (
+        select(start_col, duration_col, Build.provider + KEY_SEP + Build.pipeline, Build.queued_seconds)
+        .where(Build.started_at >= since - timedelta(hours=LOOKBACK_HOURS))
+        .where(Build.started_at < until)
+        .order_by(Build.started_at)
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    if provider:
+        query = query.where(Build.provider == provider)
+    if pipeline:
+        query = query.where(Build.pipeline == pipeline)
+
+    area = [0.0] * n_buckets
+    bucket_peak = [0] * n_buckets
+    # Per (provider, pipeline) pair: builds, busy seconds and [total, count, max] queue time,
+    # rolled up per provider / pipeline / overall at the end. Running counts and peaks can't
+    # be rolled up, so each pair also points at its provider's and pipeline's [running, peak].
+    pair_ids: Dict[str, int] = {}
+    pair_builds: List[int] = []
+    pair_busy: List[float] = []
+    pair_queued: List[list] = []
+    pair_prov: List[list] = []
+    pair_pipe: List[list] = []
+    prov_counts: Dict[str, list] = {}
+    pipe_counts: Dict[str, list] = {}
+    ends: List[tuple] = []  # min-heap of (end, pair id)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    inf = float("inf")
+    # Sweep state, kept in locals: the loop below runs once per build and is the hot path
+    running = peak = 0
+    peak_at = None
+    clock = t0
+    i = 0  # bucket holding the clock
+    bucket_end = t0 + size if n_buckets > 1 else inf
+
+    # Core (not ORM) result: plain tuples, fetched in batches of STREAM_BATCH
+    for start, duration, key, queued in db.connection().execute(query):
+        if duration is None:
+            continue  # end unknown
+        end = start + duration
+        if start < t0:
+            start = t0
+        if end > t1:
+            end = t1
+        if end <= start:
+            continue
+
+        # -1 events: builds that ended by this start, each accumulating area up to its end
+        while ends and ends[0][0] <= start:
+            t, p = heappop(ends)
+            while t >= bucket_end:
+                area[i] += running * (bucket_end - clock)
+                clock = bucket_end
+                i += 1
+                bucket_end = t0 + (i + 1) * size if i < n_buckets - 1 else inf
+                if running > bucket_peak[i]:
+                    bucket_peak[i] = running
+            area[i] += running * (t - clock)
+            clock = t
+            running -= 1
+            pair_prov[p][0] -= 1
+            pair_pipe[p][0] -= 1
+
+        # +1 event
+        while start >= bucket_end:
+            area[i] += running * (bucket_end - clock)
+            clock = bucket_end
+            i += 1
+            bucket_end = t0 + (i + 1) * size if i < n_buckets - 1 else inf
+            if running > bucket_peak[i]:
+                bucket_peak[i] = running
+        area[i] += running * (start - clock)
+        clock = start
+        running += 1
+        if running > bucket_peak[i]:
+            bucket_peak[i] = running
+        if running > peak:
+            peak = running
+            peak_at = start
+
+        p = pair_ids.get(key)
+        if p is None:
+            p = pair_ids[key] = len(pair_builds)
+            prov_key, pipe_key = key.split(KEY_SEP, 1)
+            pair_builds.append(0)
+            pair_busy.append(0.0)
+            pair_queued.append([0.0, 0, None])
+            pair_prov.append(prov_counts.setdefault(prov_key, [0, 0]))
+            pair_pipe.append(pipe_counts.setdefault(pipe_key, [0, 0]))
+        pair_builds[p] += 1
+        pair_busy[p] += end - start
+        if queued is not None:
+            q = pair_queued[p]
+            q[0] += queued
+            q[1] += 1
+            if q[2] is None or queued > q[2]:
+                q[2] = queued
+        g = pair_prov[p]
+        g[0] += 1
+        if g[0] > g[1]:
+            g[1] = g[0]
+        g = pair_pipe[p]
+        g[0] += 1
+        if g[0] > g[1]:
+            g[1] = g[0]
+        heappush(ends, (end, p))
+
+    # Drain remaining ends and close the window
+    for t in sorted(e[0] for e in ends) + [t1]:
+        while t >= bucket_end:
+            area[i] += running * (bucket_end - clock)
+            clock = bucket_end
+            i += 1
+            bucket_end = t0 + (i + 1) * size if i < n_buckets - 1 else inf
+            if running > bucket_peak[i]:
+                bucket_peak[i] = running
+        area[i] += running * (t - clock)
+        clock = t
+        running -= 1
+
+    # Roll the pairs up per provider, per pipeline and overall
+    span = t1 - t0
+    rollups = {"provider": {}, "pipeline": {}, "all": {}}
+    for key, p in pair_ids.items():
+        prov_key, pipe_key = key.split(KEY_SEP, 1)
+        for kind, group in (("provider", prov_key), ("pipeline", pipe_key), ("all", "all")):
+            total = rollups[kind].setdefault(group, [0, 0.0, [0.0, 0, None]])
+            total[0] += pair_builds[p]
+            total[1] += pair_busy[p]
+            _merge_queued(total[2], pair_queued[p])
+
+    def groups(kind: str, counts: Dict[str, list]) -> List[dict]:
+        return [
+            _group_out(k, builds, counts[k][1], busy, queued, span, capacity)
+            for k, (builds, busy, queued) in sorted(rollups[kind].items())
+        ]
+
+    builds, busy, queued = rollups["all"].get("all", [0, 0.0, [0.0, 0, None]])
+    summary = _group_out("all", builds, peak, busy, queued, span, capacity)
+    return {
+        "capacity": capacity,
+        "builds": builds,
+        "peak_concurrency": peak,
+        "peak_at": datetime.fromtimestamp(peak_at, tz=timezone.utc) if peak_at is not None else None,
+        "avg_concurrency": summary["avg_concurrency"],
+        "utilization": summary["utilization"],
+        "avg_queue_seconds": summary["avg_queue_seconds"],
+        "max_queue_seconds": summary["max_queue_seconds"],
+        "buckets": [
+            {
+                "start": datetime.fromtimestamp(t0 + i * size, tz=timezone.utc),
+                "avg_running": area[i] / min(size, t1 - (t0 + i * size)),
+                "peak_running": bucket_peak[i],
+            }
+            for i in range(n_buckets)
+        ],
+        "providers": groups("provider", prov_counts),
+        "pipelines": groups("pipeline", pipe_counts),
+    }
@@ -0,0 +1,185 @@
+import os, json, math, time, logging
+from datetime import timezone
+from typing import Dict, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Build, PipelineHealth
+
+logger = logging.getLogger(__name__)
+
+# Tuning (environment overridable)
+WARMUP = int(os.getenv("DETECTOR_WARMUP", "5"))                         # builds before alarms are raised
+ALPHA = float(os.getenv("DETECTOR_ALPHA", "0.1"))                       # baseline EWMA weight
+CUSUM_K = float(os.getenv("DETECTOR_CUSUM_K", "0.5"))                   # slack, in baseline std devs
+CUSUM_H = float(os.getenv("DETECTOR_CUSUM_H", "5.0"))                   # alarm threshold
+CUSUM_CLIP = float(os.getenv("DETECTOR_CUSUM_CLIP", "3.0"))             # max std devs one build adds (>= 3 builds to alarm)
+MIN_INCREASE = float(os.getenv("DETECTOR_MIN_INCREASE", "0.2"))         # ignore slowdowns under 20%
+MIN_REL_STD = 0.05                                                      # std floor, as a fraction of the mean
+FLIP_ALPHA = float(os.getenv("DETECTOR_FLIP_ALPHA", "0.1"))
+FLAKY_ON = float(os.getenv("DETECTOR_FLAKY_ON", "0.3"))                 # flip rate that marks a pipeline flaky
+FLAKY_OFF = float(os.getenv("DETECTOR_FLAKY_OFF", "0.15"))              # flip rate that clears it
+SNAPSHOT_SECONDS = float(os.getenv("DETECTOR_SNAPSHOT_SECONDS", "60"))
+
+Key = Tuple[str, str, str]  # (provider, repo, pipeline)
+
+class PipelineState:
+    """O(1) streaming statistics for one pipeline."""
+    __slots__ = ("n", "mean", "var", "cusum", "ref_mean", "run_n", "run_sum", "run_sq",
+                 "outcomes", "last_status", "flip_rate", "flaky", "last_started_at")
+
+    def __init__(self, **fields):
+        self.n = 0              # successful durations seen
+        self.mean = 0.0         # EWMA baseline duration
+        self.var = 0.0          # EWMA variance of duration
+        self.cusum = 0.0        # one-sided CUSUM of standardized slowdowns
+        self.ref_mean = 0.0     # baseline when the CUSUM last left zero (the estimated change point)
+        self.run_n = 0          # durations since then: count, sum, sum of squares
+        self.run_sum = 0.0
+        self.run_sq = 0.0
+        self.outcomes = 0       # success/failure results seen
+        self.last_status = None
+        self.flip_rate = 0.0    # EWMA of success<->failure flips
+        self.flaky = False
+        self.last_started_at = None  # newest build observed (epoch seconds)
+        for name, value in fields.items():
+            if name in self.__slots__:
+                setattr(self, name, value)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class HealthDetector:
+    """
+    Online duration-regression and flakiness detector.
+
+    Fed one build at a time from ``_persist``; keeps constant-size state per pipeline
+    in memory and snapshots it to ``pipeline_health`` every ``SNAPSHOT_SECONDS`` (and on
+    shutdown), so a restart resumes from the snapshot instead of rescanning history.
+    """
+
+    def __init__(self):
+        self.states: Dict[Key, PipelineState] = {}
+        self.row_ids: Dict[Key, int] = {}
+        self.dirty: set = set()
+        self.pending: List[dict] = []
+        self.last_snapshot = time.monotonic()
+
+    def load(self, db: Session):
+        for row in db.execute(select(PipelineHealth)).scalars():
+            key = (row.provider, row.repo, row.pipeline)
+            self.states[key] = PipelineState(**json.loads(row.state or "{}"))
+            self.row_ids[key] = row.id
+
+    def observe(self, build: Build) -> List[dict]:
+        """
+        Update the pipeline's statistics with a finished build; returns (and queues) raised events.
+
+        Only builds that started after the newest one already observed count: the collectors
+        re-post recent builds on every poll, and a repeated slow build must not look like a
+        sustained shift. (Builds finishing out of start order are skipped too.)
+        """
+        if build.status not in ("success", "failure") or build.started_at is None:
+            return []
+        started = build.started_at
+        if started.tzinfo is None:
+            started = started.replace(tzinfo=timezone.utc)  # SQLite returns naive UTC
+        started = started.timestamp()
+        key = (build.provider, build.repo, build.pipeline)
+        st = self.states.get(key)
+        if st is None:
+            st = self.states[key] = PipelineState()
+        if st.last_started_at is not None and started <= st.last_started_at:
+            return []
+        st.last_started_at = started
+        self.dirty.add(key)
+
+        events = []
+        base = {
+            "provider": build.provider,
+            "repo": build.repo,
+            "pipeline": build.pipeline,
+        }
+
+        # Flakiness: rate at which consecutive results flip between success and failure
+        if st.last_status is not None:
+            flipped = 1.0 if build.status != st.last_status else 0.0
+            st.flip_rate += FLIP_ALPHA * (flipped - st.flip_rate)
+        st.last_status = build.status
+        st.outcomes += 1
+        if not st.flaky and st.outcomes >= WARMUP and st.flip_rate >= FLAKY_ON:
+            st.flaky = True
+            events.append({"event": "pipeline_flaky", "data": {**base, "flip_rate": round(st.flip_rate, 3)}})
+        elif st.flaky and st.flip_rate < FLAKY_OFF:
+            st.flaky = False
+
+        # Duration regression: only successful runs, failures often stop early
+        x = build.duration_seconds
+        if build.status == "success" and x is not None and x > 0:
+            if st.n == 0:
+                st.mean = x
+            else:
+                baseline = st.mean
+                dev = x - baseline
+                if st.n >= WARMUP:
+                    scale = max(math.sqrt(st.var), MIN_REL_STD * baseline)
+                    if st.cusum == 0.0:
+                        st.ref_mean, st.run_n, st.run_sum, st.run_sq = baseline, 0, 0.0, 0.0
+                    # Each build adds at most CUSUM_CLIP, so a single outlier can't cross CUSUM_H
+                    st.cusum = max(0.0, st.cusum + min(dev / scale, CUSUM_CLIP) - CUSUM_K)
+                    if st.cusum > 0.0:
+                        st.run_n += 1
+                        st.run_sum += x
+                        st.run_sq += x * x
+                    # Outliers move the baseline no more than a CUSUM_CLIP-sigma build would
+                    dev = max(-CUSUM_CLIP * scale, min(dev, CUSUM_CLIP * scale))
+                st.mean += ALPHA * dev
+                st.var = (1 - ALPHA) * (st.var + ALPHA * dev * dev)
+                if st.cusum > CUSUM_H:
+                    # Level since the change point, i.e. the builds that pushed the CUSUM up
+                    level = st.run_sum / st.run_n
+                    increase = level / st.ref_mean - 1 if st.ref_mean > 0 else 0.0
+                    if increase >= MIN_INCREASE:
+                        events.append({"event": "pipeline_regression", "data": {
+                            **base,
+                            "baseline_seconds": round(st.ref_mean, 2),
+                            "current_seconds": round(level, 2),
+                            "increase_pct": round(increase * 100, 1),
+                        }})
+                    # Re-baseline on the post-change builds (smaller shifts are absorbed silently)
+                    st.mean = level
+                    st.var = max(st.run_sq / st.run_n - level * level, 0.0)
+                    st.cusum = 0.0
+            st.n += 1
+
+        self.pending.extend(events)
+        return events
+
+    def drain(self) -> List[dict]:
+        events, self.pending = self.pending, []
+        return events
+
+    def maybe_snapshot(self, db: Session, force: bool = False):
+        if not self.dirty:
+            return
+        if not force and time.monotonic() - self.last_snapshot < SNAPSHOT_SECONDS:
+            return
+        try:
+            for key in self.dirty:
+                state = json.dumps(self.states[key].to_dict())
+                row = db.get(PipelineHealth, self.row_ids[key]) if key in self.row_ids else None
+                if row is None:
+                    provider, repo, pipeline = key
+                    row = PipelineHealth(provider=provider, repo=repo, pipeline=pipeline, state=state)
+                    db.add(row)
+                    db.flush()
+                    self.row_ids[key] = row.id
+                else:
+                    row.state = state
+            db.commit()
+            self.dirty.clear()
+            self.last_snapshot = time.monotonic()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Detector snapshot failed: {e}")
+
+detector = HealthDetector()
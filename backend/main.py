@@ -1,16 +1,22 @@
 import os
+import json
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, desc
 from pydantic_settings import BaseSettings
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine, Base, upgrade_schema
 from models import Build
-from schemas import IngestRequest, BuildOut, SummaryOut
-from alerting import alert_failure
+from schemas import IngestRequest, BuildOut, SummaryOut, SearchOut, SearchHitOut, StagesOut, ConcurrencyOut
+from alerting import alert_failure, alert_health
 from ws import manager
+from detector import detector
+from stages import stage_rows, stage_metrics, typical_critical_path
+from concurrency import concurrency_metrics, parse_duration
+from search import init_search_index, search_builds
+from mappers import build_values, github_run_to_ingest, jenkins_webhook_to_ingest, github_jobs_to_stages, jenkins_describe_to_stages
 
 class Settings(BaseSettings):
     BACKEND_PORT: int = 8001
@@ -31,6 +37,24 @@ app.add_middleware(
 
 # DB init
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+init_search_index(engine)
+
+@app.on_event("startup")
+def load_detector_state():
+    db = SessionLocal()
+    try:
+        detector.load(db)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def save_detector_state():
+    db = SessionLocal()
+    try:
+        detector.maybe_snapshot(db, force=True)
+    finally:
+        db.close()
 
 def get_db():
     db = SessionLocal()
@@ -40,60 +64,51 @@ def get_db():
         db.close()
 
 def _persist(db: Session, provider: str, data: IngestRequest) -> Build:
-    dur = data.duration_seconds
-    if dur is None and data.completed_at:
-        dur = (data.completed_at - data.started_at).total_seconds()
-    b = Build(
-        provider=provider,
-        pipeline=data.pipeline,
-        repo=data.repo,
-        branch=data.branch,
-        status=data.status,
-        started_at=data.started_at,
-        completed_at=data.completed_at,
-        duration_seconds=dur,
-        url=data.url,
-        logs=data.logs,
-    )
+    b = Build(**build_values(provider, data))
     db.add(b)
+    if data.stages:
+        db.flush()  # assigns b.id
+        db.add_all(stage_rows(b.id, data.started_at, data.stages))
     db.commit()
     db.refresh(b)
+    # Streaming regression/flakiness detection: O(1) per build, events are sent by _announce
+    detector.observe(b)
+    detector.maybe_snapshot(db)
     return b
 
-@app.post("/ingest/github", response_model=BuildOut)
-async def ingest_github(payload: IngestRequest, db: Session = Depends(get_db)):
-    b = _persist(db, "github", payload)
+async def _announce(b: Build):
+    """Alert on failure and broadcast the build (and any detector events) to matching WebSocket clients"""
+    health_events = detector.drain()
     if b.status == "failure":
         alert_failure(b.pipeline, b.repo, b.url or "", b.logs or "")
+    for event in health_events:
+        alert_health(event)
     
-    # Broadcast real-time update to connected clients
     await manager.broadcast({
         "event": "build_ingested",
         "data": {
             "pipeline": b.pipeline,
             "repo": b.repo,
+            "branch": b.branch,
             "status": b.status,
             "provider": b.provider
         }
     })
+    for event in health_events:
+        await manager.broadcast(event)
+
+@app.post("/ingest/github", response_model=BuildOut)
+async def ingest_github(payload: IngestRequest, db: Session = Depends(get_db)):
+    b = _persist(db, "github", payload)
+    # Alert on failure and push a real-time update to subscribed clients
+    await _announce(b)
     return b
 
 @app.post("/ingest/jenkins", response_model=BuildOut)
 async def ingest_jenkins(payload: IngestRequest, db: Session = Depends(get_db)):
     b = _persist(db, "jenkins", payload)
-    if b.status == "failure":
-        alert_failure(b.pipeline, b.repo, b.url or "", b.logs or "")
-    
-    # Broadcast real-time update to connected clients
-    await manager.broadcast({
-        "event": "build_ingested",
-        "data": {
-            "pipeline": b.pipeline,
-            "repo": b.repo,
-            "status": b.status,
-            "provider": b.provider
-        }
-    })
+    # Alert on failure and push a real-time update to subscribed clients
+    await _announce(b)
     return b
 
 @app.get("/builds", response_model=List[BuildOut])
@@ -102,6 +117,28 @@ def list_builds(limit: int = 50, db: Session = Depends(get_db)):
     rows = db.execute(q).scalars().all()
     return rows
 
+@app.get("/builds/search", response_model=SearchOut)
+def search_build_logs(
+    q: str = Query(..., min_length=1),
+    pipeline: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Full-text search over build logs, ranked by relevance with highlighted snippets"""
+    try:
+        hits, next_cursor = search_builds(db, q, pipeline, status, since, until, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SearchOut(
+        query=q.strip(),
+        results=[SearchHitOut(build=BuildOut.model_validate(b), rank=rank, snippet=snippet) for b, rank, snippet in hits],
+        next_cursor=next_cursor,
+    )
+
 @app.get("/builds/latest", response_model=Optional[BuildOut])
 def latest_build(pipeline: Optional[str] = None, db: Session = Depends(get_db)):
     q = select(Build)
@@ -111,16 +148,19 @@ def latest_build(pipeline: Optional[str] = None, db: Session = Depends(get_db)):
     row = db.execute(q).scalars().first()
     return row
 
-@app.get("/metrics/summary", response_model=SummaryOut)
-def metrics_summary(window: str = "7d", db: Session = Depends(get_db)):
-    # parse window
+def _window_start(window: str) -> datetime:
+    """Start of a relative time window such as ``24h`` or ``7d`` (defaults to 7 days)."""
     now = datetime.now(timezone.utc)
     delta = timedelta(days=7)
     if window.endswith("h"):
         delta = timedelta(hours=int(window[:-1]))
     elif window.endswith("d"):
         delta = timedelta(days=int(window[:-1]))
-    since = now - delta
+    return now - delta
+
+@app.get("/metrics/summary", response_model=SummaryOut)
+def metrics_summary(window: str = "7d", db: Session = Depends(get_db)):
+    since = _window_start(window)
 
     q = select(Build).where(Build.started_at >= since)
     rows = db.execute(q).scalars().all()
@@ -146,12 +186,58 @@ def metrics_summary(window: str = "7d", db: Session = Depends(get_db)):
     )
     return out
 
+@app.get("/metrics/stages", response_model=StagesOut)
+def metrics_stages(
+    window: str = "7d",
+    pipeline: Optional[str] = None,
+    provider: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Per-stage duration percentiles, share of build time and typical critical path"""
+    metrics = stage_metrics(db, _window_start(window), pipeline, provider)
+    return StagesOut(window=window, stages=metrics, critical_path=typical_critical_path(metrics))
+
+@app.get("/metrics/concurrency", response_model=ConcurrencyOut)
+def metrics_concurrency(
+    window: str = "7d",
+    bucket: str = "1h",
+    provider: Optional[str] = None,
+    pipeline: Optional[str] = None,
+    capacity: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    """Running builds over time, peak concurrency, utilization and queue time"""
+    try:
+        data = concurrency_metrics(
+            db, _window_start(window), datetime.now(timezone.utc), parse_duration(bucket),
+            provider, pipeline, capacity,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ConcurrencyOut(window=window, bucket=bucket, **data)
+
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
     await manager.connect(ws)
     try:
         while True:
-            await ws.receive_text()  # keep-alive or ignore client msgs
+            text = await ws.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue  # keep-alive or other non-JSON client msgs
+            if not isinstance(message, dict):
+                continue
+            if message.get("action") == "subscribe":
+                try:
+                    filters = manager.subscribe(ws, message)
+                except ValueError as e:
+                    await ws.send_json({"event": "error", "data": {"detail": str(e)}})
+                    continue
+                await ws.send_json({"event": "subscribed", "data": filters})
+            elif message.get("action") == "unsubscribe":
+                manager.subscribe(ws, {})
+                await ws.send_json({"event": "subscribed", "data": {}})
     except Exception:
         pass
     finally:
@@ -166,33 +252,16 @@ async def webhook_jenkins(payload: dict, db: Session = Depends(get_db)):
         repo_info = payload.get("repository", {})
         
         # Map Jenkins data to our internal format
-        ingest_data = IngestRequest(
-            pipeline=workflow_run.get("name", "unknown"),
-            repo=repo_info.get("full_name", "unknown"),
-            branch="main",  # Jenkins webhooks might not have branch info
-            status="success" if workflow_run.get("conclusion") == "success" else "failure",
-            started_at=datetime.fromisoformat(workflow_run.get("created_at", datetime.now(timezone.utc).isoformat()).replace("Z", "+00:00")),
-            completed_at=datetime.fromisoformat(workflow_run.get("updated_at", datetime.now(timezone.utc).isoformat()).replace("Z", "+00:00")),
-            url=workflow_run.get("html_url"),
-            logs=f"Jenkins build #{workflow_run.get('run_number', 'unknown')}"
-        )
+        ingest_data = jenkins_webhook_to_ingest(workflow_run, repo_info.get("full_name", "unknown"))
+        if payload.get("stages"):
+            # Optional per-stage timings in wfapi/describe format
+            ingest_data.stages = jenkins_describe_to_stages(payload["stages"])
         
         # Persist the build
         build = _persist(db, "jenkins", ingest_data)
         
-        if build.status == "failure":
-            alert_failure(build.pipeline, build.repo, build.url or "", build.logs or "")
-        
-        # Broadcast real-time update
-        await manager.broadcast({
-            "event": "build_ingested",
-            "data": {
-                "pipeline": build.pipeline,
-                "repo": build.repo,
-                "status": build.status,
-                "provider": build.provider
-            }
-        })
+        # Alert on failure and push a real-time update to subscribed clients
+        await _announce(build)
         
         return {"status": "success", "message": "Jenkins webhook processed"}
         
@@ -213,33 +282,16 @@ async def webhook_github(payload: dict, db: Session = Depends(get_db)):
             return {"status": "ignored", "message": "Only processing completed workflows"}
         
         # Map GitHub data to our internal format
-        ingest_data = IngestRequest(
-            pipeline=workflow_run.get("name", "unknown"),
-            repo=repo_info.get("full_name", "unknown"),
-            branch=workflow_run.get("head_branch", "main"),
-            status="success" if workflow_run.get("conclusion") == "success" else "failure",
-            started_at=datetime.fromisoformat(workflow_run.get("created_at", datetime.now(timezone.utc).isoformat()).replace("Z", "+00:00")),
-            completed_at=datetime.fromisoformat(workflow_run.get("updated_at", datetime.now(timezone.utc).isoformat()).replace("Z", "+00:00")),
-            url=workflow_run.get("html_url"),
-            logs=f"GitHub Actions run #{workflow_run.get('run_number', 'unknown')}"
-        )
+        ingest_data = github_run_to_ingest(workflow_run, repo_info.get("full_name", "unknown"))
+        if payload.get("jobs"):
+            # Optional per-job timings in the Actions jobs API format
+            ingest_data.stages = github_jobs_to_stages(payload["jobs"])
         
         # Persist the build
         build = _persist(db, "github", ingest_data)
         
-        if build.status == "failure":
-            alert_failure(build.pipeline, build.repo, build.url or "", build.logs or "")
-        
-        # Broadcast real-time update
-        await manager.broadcast({
-            "event": "build_ingested",
-            "data": {
-                "pipeline": build.pipeline,
-                "repo": build.repo,
-                "status": build.status,
-                "provider": build.provider
-            }
-        })
+        # Alert on failure and push a real-time update to subscribed clients
+        await _announce(build)
         
         return {"status": "success", "message": "GitHub webhook processed"}
         
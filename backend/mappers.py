@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from schemas import IngestRequest, StageIn
+
+# Provider payload -> IngestRequest mapping shared by the webhook handlers and the
+# backfill importer, so historical and live builds are normalized identically.
+
+def parse_timestamp(value: Optional[str]) -> datetime:
+    """Parse an ISO-8601 provider timestamp (``Z`` suffix allowed), defaulting to now."""
+    if not value:
+        return datetime.now(timezone.utc)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def github_run_to_ingest(workflow_run: dict, repo: str) -> IngestRequest:
+    """
+    Map a GitHub Actions ``workflow_run`` object (webhook or REST API) to an IngestRequest.
+
+    The build starts when a runner picks it up (``run_started_at``); the wait since the run
+    was queued (``created_at``) is recorded as ``queued_seconds`` rather than build time.
+    """
+    queued = None
+    started_at = parse_timestamp(workflow_run.get("created_at"))
+    if workflow_run.get("run_started_at"):
+        run_started_at = parse_timestamp(workflow_run["run_started_at"])
+        if workflow_run.get("created_at"):
+            queued = max((run_started_at - started_at).total_seconds(), 0.0)
+        started_at = run_started_at
+    return IngestRequest(
+        pipeline=workflow_run.get("name", "unknown"),
+        repo=repo,
+        branch=workflow_run.get("head_branch") or "main",
+        status="success" if workflow_run.get("conclusion") == "success" else "failure",
+        started_at=started_at,
+        completed_at=parse_timestamp(workflow_run.get("updated_at")),
+        queued_seconds=queued,
+        url=workflow_run.get("html_url"),
+        logs=f"GitHub Actions run #{workflow_run.get('run_number', 'unknown')}"
+    )
+
+def jenkins_webhook_to_ingest(workflow_run: dict, repo: str) -> IngestRequest:
+    """Map the ``workflow_run`` block posted by our Jenkinsfile to an IngestRequest."""
+    return IngestRequest(
+        pipeline=workflow_run.get("name", "unknown"),
+        repo=repo,
+        branch="main",  # Jenkins webhooks might not have branch info
+        status="success" if workflow_run.get("conclusion") == "success" else "failure",
+        started_at=parse_timestamp(workflow_run.get("created_at")),
+        completed_at=parse_timestamp(workflow_run.get("updated_at")),
+        url=workflow_run.get("html_url"),
+        logs=f"Jenkins build #{workflow_run.get('run_number', 'unknown')}"
+    )
+
+def jenkins_queue_seconds(build: dict) -> Optional[float]:
+    """Time the build waited in the queue, from the Metrics plugin's ``TimeInQueueAction`` if present."""
+    for action in build.get("actions") or []:
+        if action and "queuingDurationMillis" in action:
+            return action["queuingDurationMillis"] / 1000.0
+    return None
+
+def jenkins_build_to_ingest(build: dict, job: str, repo: str = "jenkins") -> IngestRequest:
+    """Map a Jenkins build ``api/json`` object to an IngestRequest."""
+    result = build.get("result")  # SUCCESS/FAILURE/ABORTED/None (building)
+    if result == "SUCCESS":
+        status = "success"
+    elif result is None:
+        status = "in_progress"
+    elif result == "ABORTED":
+        status = "cancelled"
+    else:
+        status = "failure"
+    started_ts = (build.get("timestamp") or 0) / 1000.0
+    duration = (build.get("duration") or 0) / 1000.0
+    started_at = datetime.fromtimestamp(started_ts, tz=timezone.utc)
+    completed_at = None
+    if status != "in_progress" and started_ts:
+        completed_at = datetime.fromtimestamp(started_ts + duration, tz=timezone.utc)
+    return IngestRequest(
+        pipeline=job or "jenkins-job",
+        repo=repo,
+        branch="main",
+        status=status,
+        started_at=started_at,
+        completed_at=completed_at,
+        duration_seconds=duration if status != "in_progress" else None,
+        queued_seconds=jenkins_queue_seconds(build),
+        url=build.get("url"),
+        logs=f"Jenkins build #{build.get('number', 'unknown')}"
+    )
+
+def github_jobs_to_stages(jobs) -> List[StageIn]:
+    """Map GitHub Actions jobs (``runs/{id}/jobs`` response or its ``jobs`` list) to stage timings."""
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs", [])
+    return [
+        StageIn(
+            name=job.get("name", "unknown"),
+            kind="job",
+            status=job.get("conclusion") or job.get("status"),
+            started_at=parse_timestamp(job["started_at"]) if job.get("started_at") else None,
+            completed_at=parse_timestamp(job["completed_at"]) if job.get("completed_at") else None,
+        )
+        for job in jobs
+    ]
+
+def jenkins_describe_to_stages(stages) -> List[StageIn]:
+    """Map Jenkins ``wfapi/describe`` stages (response or its ``stages`` list) to stage timings."""
+    if isinstance(stages, dict):
+        stages = stages.get("stages", [])
+    out = []
+    for stage in stages:
+        start_ms = stage.get("startTimeMillis")
+        duration_ms = stage.get("durationMillis")
+        out.append(StageIn(
+            name=stage.get("name", "unknown"),
+            kind="stage",
+            status=(stage.get("status") or "").lower() or None,
+            started_at=datetime.fromtimestamp(start_ms / 1000.0, tz=timezone.utc) if start_ms else None,
+            duration_seconds=duration_ms / 1000.0 if duration_ms is not None else None,
+        ))
+    return out
+
+def build_values(provider: str, data: IngestRequest) -> dict:
+    """Column values for a ``Build`` row, deriving the duration when only timestamps are known."""
+    dur = data.duration_seconds
+    if dur is None and data.completed_at:
+        dur = (data.completed_at - data.started_at).total_seconds()
+    return {
+        "provider": provider,
+        "pipeline": data.pipeline,
+        "repo": data.repo,
+        "branch": data.branch,
+        "status": data.status,
+        "started_at": data.started_at,
+        "completed_at": data.completed_at,
+        "duration_seconds": dur,
+        "queued_seconds": data.queued_seconds,
+        "url": data.url,
+        "logs": data.logs,
+    }
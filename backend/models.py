@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, Text, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from database import Base
 
@@ -13,6 +13,43 @@ class Build(Base):
     started_at = Column(DateTime(timezone=True))
     completed_at = Column(DateTime(timezone=True), nullable=True)
     duration_seconds = Column(Float, nullable=True)
-    url = Column(String(500), nullable=True)
+    queued_seconds = Column(Float, nullable=True)  # time waiting for a runner/executor, when reported
+    url = Column(String(500), nullable=True, index=True)
     logs = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Covers the time-ordered scan used by concurrency analytics (index-only, no row lookups)
+        Index("ix_builds_timeline", "started_at", "completed_at", "duration_seconds", "status",
+              "provider", "pipeline", "queued_seconds"),
+    )
+
+class BuildStage(Base):
+    __tablename__ = "build_stages"
+    id = Column(Integer, primary_key=True, index=True)
+    build_id = Column(Integer, ForeignKey("builds.id", ondelete="CASCADE"), index=True)
+    name = Column(String(200), index=True)
+    kind = Column(String(20))                   # stage (Jenkins), job (GitHub Actions)
+    status = Column(String(20), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    offset_seconds = Column(Float, nullable=True)   # start relative to the build start
+    on_critical_path = Column(Boolean, default=False)
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(500), unique=True, index=True)  # provider:archive file path, or API stream
+    runs = Column(Integer)
+    high_water = Column(BigInteger)  # API streams: newest run id / build number with nothing pending below it
+    completed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class PipelineHealth(Base):
+    __tablename__ = "pipeline_health"
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String(20), index=True)
+    repo = Column(String(200), index=True)
+    pipeline = Column(String(100), index=True)
+    state = Column(Text)                        # JSON snapshot of the streaming detector state
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
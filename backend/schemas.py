@@ -1,7 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+class StageIn(BaseModel):
+    name: str
+    kind: str = "stage"
+    status: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+
 class IngestBase(BaseModel):
     pipeline: str
     repo: str
@@ -10,8 +18,10 @@ class IngestBase(BaseModel):
     started_at: datetime
     completed_at: Optional[datetime] = None
     duration_seconds: Optional[float] = None
+    queued_seconds: Optional[float] = None
     url: Optional[str] = None
     logs: Optional[str] = None
+    stages: Optional[List[StageIn]] = None
 
 class IngestRequest(IngestBase):
     pass
@@ -26,6 +36,7 @@ class BuildOut(BaseModel):
     started_at: datetime
     completed_at: Optional[datetime]
     duration_seconds: Optional[float]
+    queued_seconds: Optional[float] = None
     url: Optional[str]
 
     class Config:
@@ -37,3 +48,60 @@ class SummaryOut(BaseModel):
     failure_rate: float
     avg_build_time: Optional[float]
     last_status_by_pipeline: Dict[str, str]
+
+class SearchHitOut(BaseModel):
+    build: BuildOut
+    rank: float
+    snippet: Optional[str]
+
+class SearchOut(BaseModel):
+    query: str
+    results: List[SearchHitOut]
+    next_cursor: Optional[str]
+
+class StageMetricOut(BaseModel):
+    pipeline: str
+    stage: str
+    runs: int
+    avg_seconds: float
+    p50_seconds: float
+    p90_seconds: float
+    p95_seconds: float
+    max_seconds: float
+    share_of_build_time: Optional[float]
+    critical_path_share: float
+    avg_offset_seconds: Optional[float]
+
+class StagesOut(BaseModel):
+    window: str
+    stages: List[StageMetricOut]
+    critical_path: Dict[str, List[str]]
+
+class ConcurrencyBucketOut(BaseModel):
+    start: datetime
+    avg_running: float
+    peak_running: int
+
+class ConcurrencyGroupOut(BaseModel):
+    key: str
+    builds: int
+    peak_concurrency: int
+    avg_concurrency: float
+    utilization: Optional[float]
+    avg_queue_seconds: Optional[float]
+    max_queue_seconds: Optional[float]
+
+class ConcurrencyOut(BaseModel):
+    window: str
+    bucket: str
+    capacity: Optional[int]
+    builds: int
+    peak_concurrency: int
+    peak_at: Optional[datetime]
+    avg_concurrency: float
+    utilization: Optional[float]
+    avg_queue_seconds: Optional[float]
+    max_queue_seconds: Optional[float]
+    buckets: List[ConcurrencyBucketOut]
+    providers: List[ConcurrencyGroupOut]
+    pipelines: List[ConcurrencyGroupOut]
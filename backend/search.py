@@ -0,0 +1,157 @@
+import base64
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, func, text, table, column, literal, literal_column
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from models import Build
+
+# SQLite: external-content FTS5 table over builds.logs, kept in sync by triggers
+# so every insert path (ingest endpoints, webhooks, bulk imports) is indexed.
+_SQLITE_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS builds_fts_ai AFTER INSERT ON builds BEGIN
+        INSERT INTO builds_fts(rowid, logs) VALUES (new.id, new.logs);
+    END"""
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS builds_fts USING fts5(logs, content='builds', content_rowid='id')",
+    _SQLITE_INSERT_TRIGGER,
+    """CREATE TRIGGER IF NOT EXISTS builds_fts_ad AFTER DELETE ON builds BEGIN
+        INSERT INTO builds_fts(builds_fts, rowid, logs) VALUES ('delete', old.id, old.logs);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS builds_fts_au AFTER UPDATE OF logs ON builds BEGIN
+        INSERT INTO builds_fts(builds_fts, rowid, logs) VALUES ('delete', old.id, old.logs);
+        INSERT INTO builds_fts(rowid, logs) VALUES (new.id, new.logs);
+    END""",
+]
+
+# Postgres: GIN expression index, matched by the identical expression in queries.
+_PG_TSVECTOR = "to_tsvector('simple', coalesce(logs, ''))"
+_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_builds_logs_fts ON builds USING GIN ({_PG_TSVECTOR})",
+]
+
+_fts = table("builds_fts", column("rowid"))
+
+def init_search_index(engine: Engine):
+    """Create the full-text index for build logs if it does not exist yet."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'builds_fts'")
+            ).first()
+            for stmt in _SQLITE_DDL:
+                conn.execute(text(stmt))
+            if not exists:
+                # Index history that predates the FTS table
+                conn.execute(text("INSERT INTO builds_fts(builds_fts) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for stmt in _PG_DDL:
+                conn.execute(text(stmt))
+
+@contextmanager
+def bulk_indexing(conn: Connection):
+    """
+    Index rows bulk-inserted on ``conn`` with one set-based statement at the end instead
+    of the per-row insert trigger, which dominates SQLite bulk-load time.
+
+    Must be used inside the transaction that performs the inserts: the trigger is
+    dropped and recreated within it, so other writers never observe it missing.
+    """
+    if conn.dialect.name != "sqlite":
+        yield
+        return
+    # pysqlite only opens a transaction implicitly before DML, never before DDL
+    if not conn.connection.dbapi_connection.in_transaction:
+        raise RuntimeError("bulk_indexing() requires a write already issued in the current transaction")
+    start_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM builds")).scalar()
+    conn.execute(text("DROP TRIGGER IF EXISTS builds_fts_ai"))
+    yield
+    conn.execute(
+        text("INSERT INTO builds_fts(rowid, logs) SELECT id, logs FROM builds WHERE id > :start_id"),
+        {"start_id": start_id},
+    )
+    conn.execute(text(_SQLITE_INSERT_TRIGGER))
+
+def _fts5_query(q: str) -> str:
+    """Quote every term so user input (test names, paths, dashes) is never parsed as FTS5 syntax."""
+    terms = [t.replace('"', '""') for t in q.split()]
+    return " ".join(f'"{t}"' for t in terms)
+
+def encode_cursor(rank: float, build_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, build_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, build_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(build_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def search_builds(
+    db: Session,
+    q: str,
+    pipeline: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[Build, float, Optional[str]]], Optional[str]]:
+    """
+    Ranked full-text search over build logs.
+
+    Results are ordered by relevance (lower rank is better) then build id, and paged
+    with a keyset cursor over that same ordering so deep pages stay cheap.
+
+    Returns:
+        (hits, next_cursor) where each hit is (build, rank, snippet)
+    """
+    q = q.strip()
+    if not q:
+        raise ValueError("Search query must contain at least one term")
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        rank = func.bm25(literal_column("builds_fts"))
+        snippet = func.snippet(literal_column("builds_fts"), 0, "[", "]", "…", 16)
+        query = (
+            select(Build, rank, snippet)
+            .join(_fts, _fts.c.rowid == Build.id)
+            .where(literal_column("builds_fts").op("MATCH")(_fts5_query(q)))
+        )
+    elif dialect == "postgresql":
+        document = func.to_tsvector("simple", func.coalesce(Build.logs, ""))
+        tsquery = func.plainto_tsquery("simple", q)
+        # Negated so that, as with bm25, ascending order is most relevant first
+        rank = -func.ts_rank(document, tsquery)
+        snippet = func.ts_headline(
+            "simple", func.coalesce(Build.logs, ""), tsquery,
+            "StartSel=[, StopSel=], MaxFragments=2, MaxWords=16, MinWords=4",
+        )
+        query = select(Build, rank, snippet).where(document.op("@@")(tsquery))
+    else:
+        rank = literal(0.0)
+        query = select(Build, rank, literal(None)).where(Build.logs.ilike(f"%{q}%"))
+
+    if pipeline:
+        query = query.where(Build.pipeline == pipeline)
+    if status:
+        query = query.where(Build.status == status)
+    if since:
+        query = query.where(Build.started_at >= since)
+    if until:
+        query = query.where(Build.started_at < until)
+    if cursor:
+        after_rank, after_id = decode_cursor(cursor)
+        query = query.where((rank > after_rank) | ((rank == after_rank) & (Build.id > after_id)))
+
+    query = query.order_by(rank, Build.id).limit(limit + 1)
+    rows = db.execute(query).all()
+
+    hits = [(b, float(r), s) for b, r, s in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and hits:
+        last_build, last_rank, _ = hits[-1]
+        next_cursor = encode_cursor(last_rank, last_build.id)
+    return hits, next_cursor
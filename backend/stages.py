@@ -0,0 +1,173 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+from sqlalchemy import select, func, case, and_, exists
+from sqlalchemy.orm import Session
+from models import Build, BuildStage
+from schemas import StageIn
+
+# Stages that finish within this many seconds of the next one starting are treated as
+# its predecessor (providers report second- or millisecond-resolution timestamps).
+CRITICAL_PATH_TOLERANCE = 1.0
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # Payloads may mix naive and aware timestamps; naive ones are taken as UTC
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+def stage_rows(build_id: int, build_started_at: datetime, stages: List[StageIn]) -> List[BuildStage]:
+    """Build ``BuildStage`` rows for an ingested build, flagging its critical path."""
+    build_started_at = _as_utc(build_started_at)
+    intervals = []
+    for s in stages:
+        start, end, dur = _as_utc(s.started_at), _as_utc(s.completed_at), s.duration_seconds
+        if end is None and start is not None and dur is not None:
+            end = start + timedelta(seconds=dur)
+        if dur is None and start is not None and end is not None:
+            dur = (end - start).total_seconds()
+        intervals.append((start, end, dur))
+
+    on_path = critical_path([(start, end) for start, end, _ in intervals])
+    rows = []
+    for i, (s, (start, end, dur)) in enumerate(zip(stages, intervals)):
+        offset = None
+        if start is not None:
+            offset = (start - build_started_at).total_seconds()
+        rows.append(BuildStage(
+            build_id=build_id,
+            name=s.name,
+            kind=s.kind,
+            status=s.status,
+            started_at=start,
+            completed_at=end,
+            duration_seconds=dur,
+            offset_seconds=offset,
+            on_critical_path=i in on_path,
+        ))
+    return rows
+
+def critical_path(intervals: List[tuple]) -> Set[int]:
+    """
+    Indices of the stages on the critical path of one build.
+
+    Walks back from the stage that finishes last, each time picking the stage that
+    finished last before the current one started. With parallel branches this follows
+    the branch that actually gated progress. O(n log n).
+    """
+    timed = sorted(
+        (i for i, (start, end) in enumerate(intervals) if start is not None and end is not None),
+        key=lambda i: intervals[i][1],
+    )
+    if not timed:
+        return set()
+    ends = [intervals[i][1].timestamp() for i in timed]
+
+    path = set()
+    pos = len(timed) - 1
+    while pos >= 0:
+        current = timed[pos]
+        path.add(current)
+        start = intervals[current][0].timestamp()
+        # Latest-finishing stage ending by the time this one started (excluding itself)
+        pos = min(bisect_right(ends, start + CRITICAL_PATH_TOLERANCE), pos) - 1
+    return path
+
+def stage_metrics(
+    db: Session,
+    since: datetime,
+    pipeline: Optional[str] = None,
+    provider: Optional[str] = None,
+) -> List[dict]:
+    """
+    Per (pipeline, stage) duration percentiles, share of build time and critical-path
+    share over builds started since ``since``, aggregated in the database.
+
+    Percentiles are nearest-rank, computed with window functions so the same query runs
+    on SQLite and Postgres.
+    """
+    # Finished builds only: running builds report partial stage durations
+    finished = Build.status.in_(("success", "failure"))
+    filters = [Build.started_at >= since, finished, BuildStage.duration_seconds.is_not(None)]
+    if pipeline:
+        filters.append(Build.pipeline == pipeline)
+    if provider:
+        filters.append(Build.provider == provider)
+
+    partition = [Build.pipeline, BuildStage.name]
+    ranked = (
+        select(
+            Build.pipeline.label("pipeline"),
+            BuildStage.name.label("stage"),
+            BuildStage.duration_seconds.label("d"),
+            BuildStage.offset_seconds.label("offset"),
+            case((BuildStage.on_critical_path, 1.0), else_=0.0).label("crit"),
+            func.row_number().over(partition_by=partition, order_by=BuildStage.duration_seconds).label("rn"),
+            func.count().over(partition_by=partition).label("cnt"),
+        )
+        .join(Build, Build.id == BuildStage.build_id)
+        .where(and_(*filters))
+        .subquery()
+    )
+
+    def pct(p: float):
+        return func.min(case((ranked.c.rn >= p * ranked.c.cnt, ranked.c.d)))
+
+    # Total build time per pipeline, over builds that reported stages
+    build_filters = [Build.started_at >= since, finished, exists().where(BuildStage.build_id == Build.id)]
+    if pipeline:
+        build_filters.append(Build.pipeline == pipeline)
+    if provider:
+        build_filters.append(Build.provider == provider)
+    totals = (
+        select(Build.pipeline.label("pipeline"), func.sum(Build.duration_seconds).label("total"))
+        .where(and_(*build_filters))
+        .group_by(Build.pipeline)
+        .subquery()
+    )
+
+    query = (
+        select(
+            ranked.c.pipeline,
+            ranked.c.stage,
+            func.count().label("runs"),
+            func.avg(ranked.c.d).label("avg"),
+            pct(0.5).label("p50"),
+            pct(0.9).label("p90"),
+            pct(0.95).label("p95"),
+            func.max(ranked.c.d).label("max"),
+            func.sum(ranked.c.d).label("sum"),
+            func.avg(ranked.c.crit).label("crit"),
+            func.avg(ranked.c.offset).label("offset"),
+            func.max(totals.c.total).label("total"),
+        )
+        .outerjoin(totals, totals.c.pipeline == ranked.c.pipeline)
+        .group_by(ranked.c.pipeline, ranked.c.stage)
+        .order_by(ranked.c.pipeline, func.avg(ranked.c.offset), ranked.c.stage)
+    )
+
+    return [
+        {
+            "pipeline": r.pipeline,
+            "stage": r.stage,
+            "runs": r.runs,
+            "avg_seconds": r.avg,
+            "p50_seconds": r.p50,
+            "p90_seconds": r.p90,
+            "p95_seconds": r.p95,
+            "max_seconds": r.max,
+            "share_of_build_time": (r.sum / r.total) if r.total else None,
+            "critical_path_share": r.crit,
+            "avg_offset_seconds": r.offset,
+        }
+        for r in db.execute(query)
+    ]
+
+def typical_critical_path(metrics: List[dict]) -> Dict[str, List[str]]:
+    """Per pipeline, the stages on the critical path in most builds, in execution order."""
+    paths: Dict[str, List[str]] = {}
+    for m in metrics:  # already ordered by pipeline, then average start offset
+        paths.setdefault(m["pipeline"], [])
+        if m["critical_path_share"] >= 0.5:
+            paths[m["pipeline"]].append(m["stage"])
+    return paths
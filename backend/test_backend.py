@@ -5,15 +5,21 @@ Test script for CI/CD Pipeline Health Dashboard Backend
 This script tests all the core backend functionality:
 1. Data ingestion from GitHub Actions and Jenkins
 2. Metrics computation and API responses
-3. Alert system (Slack/Email)
-4. Real-time WebSocket updates
+3. Full-text search over build logs, stage-level timing and concurrency metrics
+4. Historical backfill import from archive fixtures
+5. Streaming duration-regression and flakiness detection
+6. Alert system (Slack/Email)
+7. Real-time WebSocket updates and subscription filtering
 """
 
 import asyncio
 import json
+import os
+import sqlite3
+import tempfile
 import requests
 import websockets
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import time
 
 BACKEND_URL = "http://localhost:8001"
@@ -126,6 +132,202 @@ def test_builds_api():
         print(f"❌ Builds API error: {e}")
     return None
 
+def test_stages_api():
+    """Test stage-level timing ingestion and the /metrics/stages endpoint"""
+    print("\n🧪 Testing stage metrics API...")
+    
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    at = lambda seconds: (start + timedelta(seconds=seconds)).isoformat()
+    # Checkout, then Unit Tests and Lint in parallel, then Deploy
+    payload = {
+        "pipeline": "stage-timing-check",
+        "repo": "test-org/test-repo",
+        "branch": "main",
+        "status": "success",
+        "started_at": at(0),
+        "completed_at": at(115),
+        "stages": [
+            {"name": "Checkout", "started_at": at(0), "duration_seconds": 10},
+            {"name": "Unit Tests", "started_at": at(10), "duration_seconds": 90},
+            {"name": "Lint", "started_at": at(10), "duration_seconds": 20},
+            {"name": "Deploy", "started_at": at(100), "duration_seconds": 15},
+        ],
+    }
+    
+    try:
+        requests.post(f"{BACKEND_URL}/ingest/jenkins", json=payload)
+        response = requests.get(f"{BACKEND_URL}/metrics/stages", params={"window": "1d", "pipeline": "stage-timing-check"})
+        if response.status_code == 200:
+            data = response.json()
+            path = data["critical_path"].get("stage-timing-check")
+            print(f"✅ Stage metrics API working - {len(data['stages'])} stages, critical path: {path}")
+            return data
+        else:
+            print(f"❌ Stage metrics API failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Stage metrics API error: {e}")
+    return None
+
+def test_concurrency_api():
+    """Test build concurrency and queue-time analytics"""
+    print("\n🧪 Testing concurrency API...")
+    
+    start = datetime.now(timezone.utc) - timedelta(minutes=30)
+    # Three overlapping builds: peak concurrency of at least 3 around the 10-minute mark
+    for i, queued in enumerate([5, 30, 90]):
+        requests.post(f"{BACKEND_URL}/ingest/github", json={
+            "pipeline": "concurrency-check",
+            "repo": "test-org/test-repo",
+            "branch": "main",
+            "status": "success",
+            "started_at": (start + timedelta(minutes=i * 2)).isoformat(),
+            "completed_at": (start + timedelta(minutes=15)).isoformat(),
+            "queued_seconds": queued,
+        })
+    
+    try:
+        response = requests.get(f"{BACKEND_URL}/metrics/concurrency",
+                                params={"window": "1d", "bucket": "1h", "pipeline": "concurrency-check", "capacity": 4})
+        if response.status_code == 200:
+            data = response.json()
+            print(f"✅ Concurrency API working - peak {data['peak_concurrency']} running, "
+                  f"avg queue {data['avg_queue_seconds']}s, {len(data['buckets'])} buckets")
+            return data
+        else:
+            print(f"❌ Concurrency API failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Concurrency API error: {e}")
+    return None
+
+def test_search_api():
+    """Test full-text search over build logs"""
+    print("\n🧪 Testing build log search API...")
+    
+    try:
+        response = requests.get(f"{BACKEND_URL}/builds/search", params={"q": "timeout", "limit": 5})
+        if response.status_code == 200:
+            data = response.json()
+            print(f"✅ Search API working - {len(data['results'])} matching builds")
+            for hit in data["results"][:3]:
+                print(f"   {hit['build']['pipeline']} ({hit['build']['status']}): {hit['snippet']}")
+            return data
+        else:
+            print(f"❌ Search API failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Search API error: {e}")
+    return None
+
+def test_backfill_import():
+    """Test the historical backfill importer against fixture archives (no server needed)"""
+    print("\n🧪 Testing backfill importer...")
+    
+    from sqlalchemy import create_engine
+    from backfill import Importer, github_rows, import_api_pages, next_high_water, run_backfill, run_ids
+    fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "backfill")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/backfill.db"
+        github = run_backfill("github", [os.path.join(fixtures, "github_runs_page_1.json")], database_url=db_url, workers=2)
+        jenkins = run_backfill("jenkins", [os.path.join(fixtures, "jenkins_job.json")], database_url=db_url, workers=2)
+        # A later dump with build #13 finished (it was still running above)
+        later = run_backfill("jenkins", [os.path.join(fixtures, "jenkins_job_later.json")], database_url=db_url, workers=2)
+        # Re-running is a no-op thanks to the checkpoints
+        reruns = [
+            run_backfill("github", [os.path.join(fixtures, "github_runs_page_1.json")], database_url=db_url, workers=2),
+            run_backfill("jenkins", [os.path.join(fixtures, "jenkins_job.json"), os.path.join(fixtures, "jenkins_job_later.json")],
+                         database_url=db_url, workers=2),
+        ]
+        with sqlite3.connect(f"{tmp}/backfill.db") as conn:
+            build_13 = conn.execute("SELECT status, duration_seconds FROM builds WHERE url LIKE '%/13/'").fetchall()
+        
+        # API paging against an in-memory listing (newest first, 100 runs per page)
+        listing = [{"id": i, "status": "completed", "conclusion": "success", "name": "api-check",
+                    "html_url": f"https://github.com/o/r/actions/runs/{i}"} for i in range(250, 0, -1)]
+        listing[0]["status"] = "in_progress"
+        pages_read = []
+        def load_wave(first, count):
+            for page in range(first, first + count):
+                pages_read.append(page)
+                document = {"workflow_runs": listing[page * 100:(page + 1) * 100]}
+                seen, rows = github_rows(document, "o/r")
+                yield f"page-{page}", seen, rows, run_ids("github", document)
+        importer = Importer(create_engine(db_url), stream="api:github:o/r")
+        import_api_pages(importer, load_wave, 2)
+        first_pass = (importer.imported, list(pages_read), importer.high_water())
+        # Run 250 finishes and ten new runs arrive: only page 0 is needed
+        listing[0]["status"] = "completed"
+        listing[:0] = [{**listing[-1], "id": i, "html_url": f"https://github.com/o/r/actions/runs/{i}"} for i in range(260, 250, -1)]
+        pages_read.clear()
+        importer = Importer(create_engine(db_url), stream="api:github:o/r")
+        import_api_pages(importer, load_wave, 2)
+        second_pass = (importer.imported, list(pages_read), importer.high_water())
+    
+    # In-progress GitHub runs and running Jenkins builds are skipped, duplicate Jenkins builds are dropped
+    assert github.imported == 2, github.imported
+    assert jenkins.imported == 3 and jenkins.skipped == 1, (jenkins.imported, jenkins.skipped)
+    assert later.imported == 1 and later.skipped == 1, (later.imported, later.skipped)
+    assert build_13 == [("success", 120.0)], build_13
+    assert all(r.imported == 0 and r.sources_done == 0 for r in reruns), [(r.imported, r.sources_done) for r in reruns]
+    # Stops at the empty page; the mark stays below the running run, so it is picked up next time
+    assert first_pass == (249, [0, 1, 2, 3], 249), first_pass
+    assert second_pass == (11, [0], 260), second_pass
+    
+    # API imports: the high-water mark is the newest finished run, kept below any still running
+    assert next_high_water([(30, True), (29, True), (28, True)], None) == 30
+    assert next_high_water([(30, True), (29, False), (28, True)], None) == 28
+    assert next_high_water([(31, False)], 27) == 27
+    assert next_high_water([], 27) == 27
+    assert next_high_water([], None) is None
+    assert run_ids("github", {"workflow_runs": [{"id": 9004, "status": "queued"}, {"id": 9003, "status": "completed"}]}) \
+        == [(9004, False), (9003, True)]
+    assert run_ids("jenkins", {"allBuilds": [{"number": 13, "result": None}, {"number": 12, "result": "SUCCESS"}]}) \
+        == [(13, False), (12, True)]
+    print("✅ Backfill importer working - fixtures imported once, re-run resumed from checkpoints")
+    return True
+
+def test_health_detector():
+    """Test the streaming regression/flakiness detector (no server needed)"""
+    print("\n🧪 Testing pipeline health detector...")
+    
+    from detector import HealthDetector
+    from models import Build
+    
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    count = iter(range(1000))
+    def build(status, duration, pipeline="detector-check"):
+        return Build(provider="github", repo="test-org/test-repo", pipeline=pipeline, branch="main", status=status,
+                     started_at=start + timedelta(hours=next(count)), duration_seconds=duration)
+    
+    detector = HealthDetector()
+    events = []
+    # The same slow build re-posted by the collectors on every poll counts once
+    for i in range(30):
+        events += detector.observe(build("success", 100 + (i % 3), pipeline="repost-check"))
+    slow = build("success", 200, pipeline="repost-check")
+    for _ in range(4):
+        events += detector.observe(slow)
+    assert not events, events
+    assert detector.states[("github", "test-org/test-repo", "repost-check")].n == 31
+    # Stable ~100s builds with a single 150s outlier: not a regression
+    for i in range(40):
+        events += detector.observe(build("success", 150 if i == 25 else 100 + (i % 3)))
+    assert not events, events
+    # Then a sustained 40% slowdown
+    for _ in range(5):
+        events += detector.observe(build("success", 140))
+    regressions = [e for e in events if e["event"] == "pipeline_regression"]
+    assert len(regressions) == 1, events
+    assert regressions[0]["data"]["current_seconds"] == 140, regressions
+    assert 35 <= regressions[0]["data"]["increase_pct"] <= 45, regressions
+    
+    # Alternating results on another pipeline
+    flaky = []
+    for i in range(20):
+        flaky += detector.observe(build("success" if i % 2 else "failure", 60, pipeline="flaky-check"))
+    assert [e["event"] for e in flaky] == ["pipeline_flaky"], flaky
+    
+    print(f"✅ Health detector working - slowdown of {regressions[0]['data']['increase_pct']}% and flakiness detected")
+    return True
+
 async def test_websocket():
     """Test WebSocket real-time updates"""
     print("\n🧪 Testing WebSocket connection...")
@@ -146,6 +348,34 @@ async def test_websocket():
     except Exception as e:
         print(f"❌ WebSocket connection error: {e}")
 
+async def test_websocket_subscription():
+    """Test that subscribed WebSocket clients only receive matching builds"""
+    print("\n🧪 Testing WebSocket subscriptions...")
+    
+    try:
+        async with websockets.connect(WS_URL) as websocket:
+            await websocket.send(json.dumps({"action": "subscribe", "repos": ["test-org/subscribed-repo"]}))
+            ack = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5.0))
+            print(f"✅ Subscription acknowledged: {ack['data']}")
+            
+            base = {
+                "pipeline": "subscription-check",
+                "branch": "main",
+                "status": "success",
+                "started_at": datetime.now(timezone.utc).isoformat(),
+            }
+            requests.post(f"{BACKEND_URL}/ingest/github", json={**base, "repo": "test-org/other-repo"})
+            requests.post(f"{BACKEND_URL}/ingest/github", json={**base, "repo": "test-org/subscribed-repo"})
+            
+            message = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5.0))
+            if message["data"]["repo"] == "test-org/subscribed-repo":
+                print("✅ Only the subscribed repo's build was delivered")
+                return True
+            print(f"❌ Received unsubscribed build: {message}")
+    except Exception as e:
+        print(f"❌ WebSocket subscription error: {e}")
+    return False
+
 def run_integration_test():
     """Run a complete integration test"""
     print("🚀 Starting CI/CD Dashboard Backend Integration Test")
@@ -162,9 +392,15 @@ def run_integration_test():
     # Test APIs
     metrics = test_metrics_api()
     builds = test_builds_api()
+    search = test_search_api()
+    stages = test_stages_api()
+    concurrency = test_concurrency_api()
+    backfill = test_backfill_import()
+    detector = test_health_detector()
     
     # Test WebSocket
     asyncio.run(test_websocket())
+    subscription = asyncio.run(test_websocket_subscription())
     
     # Summary
     print("\n" + "=" * 60)
@@ -174,6 +410,12 @@ def run_integration_test():
     print(f"   ✅ Jenkins Ingestion: {'OK' if jenkins_build else 'FAIL'}")
     print(f"   ✅ Metrics API: {'OK' if metrics else 'FAIL'}")
     print(f"   ✅ Builds API: {'OK' if builds else 'FAIL'}")
+    print(f"   ✅ Search API: {'OK' if search else 'FAIL'}")
+    print(f"   ✅ Stage Metrics API: {'OK' if stages else 'FAIL'}")
+    print(f"   ✅ Concurrency API: {'OK' if concurrency else 'FAIL'}")
+    print(f"   ✅ Backfill Import: {'OK' if backfill else 'FAIL'}")
+    print(f"   ✅ Health Detector: {'OK' if detector else 'FAIL'}")
+    print(f"   ✅ WebSocket Subscriptions: {'OK' if subscription else 'FAIL'}")
     print("\n🏆 Backend implementation is working correctly!")
 
 if __name__ == "__main__":
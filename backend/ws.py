@@ -1,21 +1,111 @@
-from typing import List
+from collections import defaultdict
+from typing import Dict, List, Set
 from fastapi import WebSocket
 
+# Subscribe message field -> event data key it filters on
+SUBSCRIPTION_FIELDS = {
+    "pipelines": "pipeline",
+    "repos": "repo",
+    "branches": "branch",
+    "providers": "provider",
+    "statuses": "status",
+}
+
 class ConnectionManager:
+    """
+    Tracks WebSocket clients and routes events to them.
+
+    Clients that never subscribe receive every event. A subscribed client receives an
+    event only if, for every field it filters on that the event carries, the event's
+    value is in its allowed set; fields an event doesn't carry (e.g. ``status`` on
+    pipeline health events) don't filter it out. Routing uses an inverted index
+    (field -> value -> connections) and counts hits per connection, so each event costs
+    time proportional to the connections matching at least one of its values rather
+    than to the total number of clients.
+    """
+
     def __init__(self):
         self.active: List[WebSocket] = []
+        self.unfiltered: Set[WebSocket] = set()
+        self.filters: Dict[WebSocket, Dict[str, Set[str]]] = {}
+        self.index: Dict[str, Dict[str, Set[WebSocket]]] = defaultdict(lambda: defaultdict(set))
+        # Subscribed connections grouped by the set of fields they filter on (at most 2^5 groups)
+        self.by_fields: Dict[frozenset, Set[WebSocket]] = defaultdict(set)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active.append(websocket)
+        self.unfiltered.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active:
             self.active.remove(websocket)
+        self.unfiltered.discard(websocket)
+        self._unindex(websocket)
+
+    def subscribe(self, websocket: WebSocket, message: dict) -> Dict[str, List[str]]:
+        """
+        Replace the client's filters from a subscribe message; no filters means all events.
+
+        Each field takes a string or a list of strings/numbers. Raises ValueError on anything
+        else, leaving the previous filters in place.
+        """
+        filters = {}
+        for field, key in SUBSCRIPTION_FIELDS.items():
+            values = message.get(field)
+            if values is None:
+                continue
+            if isinstance(values, (str, int, float)):
+                values = [values]
+            if not isinstance(values, list) or not all(isinstance(v, (str, int, float)) for v in values):
+                raise ValueError(f"'{field}' must be a string or a list of strings")
+            if values:
+                filters[key] = {str(v) for v in values}
+
+        self._unindex(websocket)
+        if filters:
+            self.unfiltered.discard(websocket)
+            self.filters[websocket] = filters
+            self.by_fields[frozenset(filters)].add(websocket)
+            for key, values in filters.items():
+                for value in values:
+                    self.index[key][value].add(websocket)
+        else:
+            self.unfiltered.add(websocket)
+        return {field: sorted(filters[key]) for field, key in SUBSCRIPTION_FIELDS.items() if key in filters}
+
+    def _unindex(self, websocket: WebSocket):
+        filters = self.filters.pop(websocket, {})
+        if filters:
+            group = self.by_fields[frozenset(filters)]
+            group.discard(websocket)
+            if not group:
+                del self.by_fields[frozenset(filters)]
+        for key, values in filters.items():
+            for value in values:
+                subscribers = self.index[key].get(value)
+                if subscribers is not None:
+                    subscribers.discard(websocket)
+                    if not subscribers:
+                        del self.index[key][value]
+
+    def recipients(self, data: dict) -> List[WebSocket]:
+        """Connections whose subscription matches the event data."""
+        present = {key for key in SUBSCRIPTION_FIELDS.values() if data.get(key) is not None}
+        hits: Dict[WebSocket, int] = defaultdict(int)
+        for key in present:
+            for ws in self.index.get(key, {}).get(str(data[key]), ()):
+                hits[ws] += 1
+        matched = [ws for ws, n in hits.items() if n == len(self.filters[ws].keys() & present)]
+        # Clients that only filter on fields this event doesn't carry
+        for fields, group in self.by_fields.items():
+            if not fields & present:
+                matched.extend(group)
+        return list(self.unfiltered) + matched
 
     async def broadcast(self, message: dict):
         to_drop = []
-        for ws in self.active:
+        for ws in self.recipients(message.get("data") or {}):
             try:
                 await ws.send_json(message)
             except Exception: